@@ -1,7 +1,6 @@
 from datetime import datetime
 import os
 from dataclasses import dataclass
-import requests
 import json
 
 
@@ -118,6 +117,8 @@ class AzureToken:
         Returns:
             AzureToken: An instance of AzureToken
         """
+        import requests
+
         print("requesting new token")
         azure_args["grant_type"] = "client_credentials"
         azure_args["scope"] = azure_args["resource"]
@@ -1,27 +1,105 @@
-import requests
 import json
+import os
 from datetime import datetime
+from functools import lru_cache
 from azure import AzureToken
-from dataclasses import dataclass
-from dataclasses_json import dataclass_json
-from enum import Enum
-from typing import List
+from dataclasses import MISSING, dataclass, field, fields, is_dataclass
+from typing import Dict, List, get_args, get_origin, get_type_hints
 
-FUNCTION_TYPE = type(print)
+
+# Seconds until the cached Frends topology expires
+TOPOLOGY_TTL = 86400
+
+
+class FrendsNotFoundError(Exception):
+    """The Frends API returned 404 for a resource"""
+
+
+@lru_cache(maxsize=None)
+def _type_hints(cls):
+    """Resolve the type hints of a class once
+
+    Args:
+        cls (type): The dataclass
+
+    Returns:
+        dict: Type hints by field name
+    """
+    return get_type_hints(cls)
+
+
+def _decode(hint, value):
+    """Convert a json value to the given type hint
+
+    Args:
+        hint (type): The type hint of the target field
+        value (any): The json value
+
+    Returns:
+        any: The converted value
+    """
+    if value is None:
+        return None
+
+    if is_dataclass(hint) and isinstance(value, dict):
+        return hint.from_dict(value)
+
+    if get_origin(hint) is list and isinstance(value, list):
+        (item_hint,) = get_args(hint)
+        return [_decode(item_hint, item) for item in value]
+
+    return value
+
+
+class JsonMixin:
+    """Minimal json unmarshalling for dataclasses, unknown keys are ignored"""
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """Create an instance from a dictionary
+
+        Unknown keys are ignored, missing fields without a default are set to None.
+
+        Args:
+            data (dict): The json object
+
+        Returns:
+            object: An instance of the class
+        """
+        hints = _type_hints(cls)
+        kwargs = {}
+
+        for f in fields(cls):
+            if f.name in data:
+                kwargs[f.name] = _decode(hints[f.name], data[f.name])
+            elif f.default is MISSING and f.default_factory is MISSING:
+                kwargs[f.name] = None
+
+        return cls(**kwargs)
+
+    @classmethod
+    def from_json(cls, data: str):
+        """Create an instance from a json string
+
+        Args:
+            data (str): The json string
+
+        Returns:
+            object: An instance of the class
+        """
+        return cls.from_dict(json.loads(data))
 
 
-@dataclass_json
 @dataclass
-class FrendsEnvironmentBase:
+class FrendsEnvironmentBase(JsonMixin):
     """Class for marshalling/unmarshalling a json object"""
 
     id: int
     displayName: str
 
 
-@dataclass_json
 @dataclass
-class FrendsEnvironmentVariableValue:
+class FrendsEnvironmentVariableValue(JsonMixin):
     """Class for marshalling/unmarshalling a json object"""
 
     environment: FrendsEnvironmentBase
@@ -31,9 +109,8 @@ class FrendsEnvironmentVariableValue:
     version: int = None
 
 
-@dataclass_json
 @dataclass
-class FrendsEnvironmentVariable:
+class FrendsEnvironmentVariable(JsonMixin):
     """Class for marshalling/unmarshalling a json object"""
 
     id: int
@@ -52,13 +129,11 @@ class FrendsEnvironmentVariable:
             for item in self.childSchemasJson:
                 item["valuesJson"] = item.pop("values")
 
-                self.childSchemas.append(
-                    FrendsEnvironmentVariable.from_json(json.dumps(item))
-                )
+                self.childSchemas.append(FrendsEnvironmentVariable.from_dict(item))
 
         if self.valuesJson is not None:
             self.values = [
-                FrendsEnvironmentVariableValue.from_json(json.dumps(x))
+                FrendsEnvironmentVariableValue.from_dict(x)
                 for x in self.valuesJson
             ]
 
@@ -69,22 +144,110 @@ class FrendsEnvironmentVariable:
         return repr(self.__str__())
 
 
+@dataclass
+class FrendsTopology:
+    """
+    Agent environments and environment variable groups in Frends
+    with caching functionality
+    """
+
+    environments: List[int] = None
+    groups: Dict[str, int] = field(default_factory=dict)
+    described: List[str] = field(default_factory=list)
+    created_on: float = field(default_factory=lambda: datetime.now().timestamp())
+    ttl: int = TOPOLOGY_TTL
+    cache_path: str = None
+
+    def is_valid(self):
+        """Check if the topology is still within its TTL
+
+        Returns:
+            bool: Valid true/false
+        """
+        return self.created_on + self.ttl > datetime.now().timestamp()
+
+    def invalidate(self):
+        """Forget everything discovered so far and start over"""
+        print("invalidating topology cache")
+        self.environments = None
+        self.groups = {}
+        self.described = []
+        self.created_on = datetime.now().timestamp()
+        self.save_cache()
+
+    def save_cache(self):
+        if not self.cache_path:
+            return
+
+        try:
+            with open(self.cache_path, "w") as f:
+                json.dump(self.__dict__, f)
+
+        except Exception as e:
+            print("An error occured while saving Frends topology cache: " + str(e))
+
+    @classmethod
+    def from_cache(cls, cache_path: str = None, ttl: int = TOPOLOGY_TTL):
+        """Get the topology from cache, or an empty one if the cache is missing or expired
+
+        Args:
+            cache_path (str, optional): Path to the cache file. Defaults to None.
+            ttl (int, optional): Seconds until the cached topology expires. Defaults to TOPOLOGY_TTL.
+
+        Returns:
+            FrendsTopology: FrendsTopology instance
+        """
+        if not cache_path or not os.path.isfile(cache_path):
+            print("topology cache not found or path not set")
+            return cls(ttl=ttl, cache_path=cache_path)
+
+        try:
+            with open(cache_path, "r") as f:
+                cl = cls(**json.load(f))
+
+            cl.ttl = ttl
+            cl.cache_path = cache_path
+            if cl.is_valid():
+                print("topology cache loaded")
+                return cl
+
+            print("topology cache has expired")
+        except Exception as e:
+            print("Frends topology cache not valid: " + str(e))
+
+        return cls(ttl=ttl, cache_path=cache_path)
+
+
 class FrendsClient:
     """
     The client used to send requests to Frends
     """
 
-    def __init__(self, url: str, token: AzureToken):
+    def __init__(self, url: str, token: AzureToken, topology: FrendsTopology = None):
         self.url = url
         self.token = token
 
-        self.environments = []
-        self.get_agentgroups()
+        self.topology = topology or FrendsTopology()
+
+        # Whether the environments were fetched from Frends during this run
+        self.environments_checked = False
+
+    @property
+    def environments(self):
+        """The agent environment ids, fetched on first use
+
+        Returns:
+            list: The environment ids
+        """
+        if self.topology.environments is None:
+            self.get_agentgroups()
+
+        return self.topology.environments
 
     def request(
         self,
         path: str,
-        method: FUNCTION_TYPE = requests.get,
+        method: str = "GET",
         args=None,
         argtype: str = "json",
     ):
@@ -92,19 +255,21 @@ class FrendsClient:
 
         Args:
             path (str): resource path
-            method (FUNCTION_TYPE, optional): The request method to use. Defaults to requests.get.
+            method (str, optional): The HTTP method to use. Defaults to "GET".
             args (dict, optional): Arguments to include with the request. Defaults to None.
             argtype (str, optional): Type of arguments. Defaults to 'json'.
 
         Returns:
             dict: Resulting dictionary from the request
         """
+        import requests
+
         print("Requesting url " + self.url + path)
         common = {
             "url": f"{self.url}{path}",
             "headers": self.token.get_headers(),
         }
-        if method == requests.get:
+        if method == "GET":
             common["params"] = args
         elif argtype == "json":
             common["json"] = args
@@ -114,21 +279,29 @@ class FrendsClient:
         else:
             common["data"] = args
 
-        req = method(**common)
+        req = requests.request(method, **common)
         if req.status_code < 300:
             try:
                 return req.json()
             except:
                 return req.text
 
+        if req.status_code == 404:
+            raise FrendsNotFoundError("Not found", req.status_code, req.text)
+
         raise Exception("An error occured", req.status_code, req.text)
 
     def get_agentgroups(self):
         """Get all agent groups from Frends"""
-        req = self.request("/environments", requests.get)
+        req = self.request("/environments", "GET")
+        environments = []
         for envi in req["data"]:
-            if envi["id"] not in self.environments:
-                self.environments.append(envi["id"])
+            if envi["id"] not in environments:
+                environments.append(envi["id"])
+
+        self.topology.environments = environments
+        self.topology.save_cache()
+        self.environments_checked = True
 
     def set_env_description(self, id: str, description: str):
         """Set the description of the environment variable/group
@@ -140,7 +313,7 @@ class FrendsClient:
         if description is not None:
             self.request(
                 f"/environment-variables/{id}",
-                requests.patch,
+                "PATCH",
                 {"description": description},
             )
 
@@ -151,13 +324,62 @@ class FrendsClient:
             name (str): Name of the group
 
         Returns:
-            dict: The group data
+            int: The identifier of the group
         """
         print("Creating environment group...")
 
-        reval = self.request("/environment-variables", requests.post, {"name": name})
+        reval = self.request("/environment-variables", "POST", {"name": name})
+        data = reval.get("data", None)
+
+        return data["id"] if isinstance(data, dict) else data
+
+    def get_group_id(self, name: str, description: str = None):
+        """Get the identifier of an environment variable group, creating it if missing
+
+        Known groups and descriptions are taken from the topology cache
+        without making any requests.
+
+        Args:
+            name (str): Name of the group
+            description (str, optional): The description to set on the group. Defaults to None.
+
+        Returns:
+            int: The identifier of the group
+        """
+        envid = self.topology.groups.get(name)
+        cached = envid is not None
+
+        if not cached:
+            frends = self.get_env(name)
+            envid = frends.id if frends is not None else self.create_env_group(name)
 
-        return reval.get("data", None)
+            if isinstance(envid, int):
+                self.topology.groups[name] = envid
+
+            # Skip the PATCH if the description is already set in Frends
+            if (
+                frends is not None
+                and description is not None
+                and frends.description == description
+                and name not in self.topology.described
+            ):
+                self.topology.described.append(name)
+
+            self.topology.save_cache()
+
+        if description is not None and name not in self.topology.described:
+            try:
+                self.set_env_description(envid, description)
+                self.topology.described.append(name)
+                self.topology.save_cache()
+            except FrendsNotFoundError:
+                # A cached id that no longer exists means the topology is stale
+                if cached:
+                    raise
+            except Exception:
+                pass
+
+        return envid
 
     def get_env(self, name: str):
         """Fetches an environment variable from Frends
@@ -168,6 +390,8 @@ class FrendsClient:
         Returns:
             FrendsEnvironmentVariable: An environment variable object
         """
+        import requests
+
         print("Fetching variable...")
         req = requests.get(
             f"{self.url}/environment-variables?environmentVariableName={name}",
@@ -177,7 +401,7 @@ class FrendsClient:
         if req.status_code == 200:
             res = req.json()
             if len(res["data"]) > 0:
-                return FrendsEnvironmentVariable.from_json(json.dumps(res["data"][0]))
+                return FrendsEnvironmentVariable.from_dict(res["data"][0])
             return None
 
         raise Exception("Error occured", req.status_code, req.text)
@@ -205,7 +429,7 @@ class FrendsClient:
         if check is None:
             self.request(
                 f"/environment-variables/{parent}",
-                requests.post,
+                "POST",
                 {
                     "type": var_type,
                     "name": name,
@@ -221,12 +445,23 @@ class FrendsClient:
                 try:
                     self.request(
                         f"/environment-variables/{check.id}/values/{env}",
-                        requests.put,
+                        "PUT",
                         content,
                     )
                 except Exception as e:
+                    # The environment ids may come from the cache, make sure
+                    # the environment still exists before trying the workaround
+                    if not self.environments_checked:
+                        self.get_agentgroups()
+
+                    if env not in self.topology.environments:
+                        print("Environment no longer exists, skipping...")
+                        continue
+
                     # Workaround for API bug where no values can be updated
                     # if the env var does not exist for that environment
+                    import requests
+
                     print(
                         "Setting environment value for environment failed, trying the workaround...."
                     )
@@ -243,6 +478,11 @@ class FrendsClient:
                         ],
                     )
 
+                    if resp.status_code == 404:
+                        raise FrendsNotFoundError(
+                            "Environment not found", resp.status_code, resp.text
+                        )
+
                     if resp.status_code > 200:
                         raise Exception(
                             "Workaround failed as well", resp.status_code, resp.text
@@ -261,7 +501,7 @@ class FrendsClient:
         print("Listing environment variables")
         response = self.request(
             "/environment-variables",
-            requests.get,
+            "GET",
             {"pagingQuery.pageNumber": page_number, "pagingQuery.pageSize": page_size},
         )
 
@@ -272,7 +512,7 @@ class FrendsClient:
                 envv["childSchemasJson"] = envv.pop("childSchemas")
                 envv["valuesJson"] = envv.pop("values")
 
-                envvar = FrendsEnvironmentVariable.from_json(json.dumps(envv))
+                envvar = FrendsEnvironmentVariable.from_dict(envv)
                 envvars[envvar.name] = envvar
 
         return envvars
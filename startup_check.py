@@ -0,0 +1,101 @@
+import os
+import re
+import subprocess
+import sys
+
+
+# Modules that must not be loaded before the first request is made
+HEAVY_MODULES = [
+    "requests",
+    "urllib3",
+    "hvac",
+    "dotenv",
+    "dataclasses_json",
+    "marshmallow",
+    "typing_inspect",
+]
+
+# Everything synk needs before the first request, i.e. the import
+# and the configuration from the environment
+STARTUP_CODE = "import synk; synk.Sync()"
+
+STARTUP_ENV = {
+    "AZURE_TENANT": "startup-check",
+    "AZURE_CLIENT_ID": "startup-check",
+    "AZURE_CLIENT_SECRET": "startup-check",
+    "AZURE_RESOURCE": "startup-check",
+    "VAULT_ADDR": "https://vault.invalid",
+    "VAULT_TOKEN": "startup-check",
+    "VAULT_STORE": "startup-check",
+    "FRENDS_API_URL": "https://frends.invalid/api/v0.9",
+}
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def measure_startup():
+    """Run the startup path under -X importtime
+
+    Returns:
+        dict: Cumulative import time in microseconds per module
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_CODE],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, **STARTUP_ENV},
+        capture_output=True,
+        text=True,
+    )
+
+    if result.returncode != 0:
+        raise Exception("Startup path failed", result.returncode, result.stderr)
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            modules[match.group(4)] = int(match.group(2))
+
+    return modules
+
+
+def check_startup(budget_ms: float):
+    """Check that the startup path stays light
+
+    Args:
+        budget_ms (float): Maximum cumulative import time of synk in milliseconds
+
+    Returns:
+        list: The problems found, empty if the check passed
+    """
+    modules = measure_startup()
+    problems = []
+
+    for name in modules:
+        if name.split(".")[0] in HEAVY_MODULES:
+            problems.append("Heavy module imported before first request: " + name)
+
+    print(f"modules imported: {len(modules)}")
+
+    if "synk" not in modules:
+        problems.append("Import time of synk not found in -X importtime output")
+        return problems
+
+    synk_ms = modules["synk"] / 1000
+    print(f"synk import time: {synk_ms:.1f} ms (budget {budget_ms:.1f} ms)")
+
+    if synk_ms > budget_ms:
+        problems.append(
+            f"Import time {synk_ms:.1f} ms exceeds budget {budget_ms:.1f} ms"
+        )
+
+    return problems
+
+
+if __name__ == "__main__":
+    problems = check_startup(float(os.getenv("STARTUP_BUDGET_MS", "150")))
+
+    for problem in problems:
+        print(problem)
+
+    sys.exit(1 if problems else 0)
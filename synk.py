@@ -1,21 +1,43 @@
-import requests
 import json
-import re
-from datetime import datetime
-from dotenv import load_dotenv
 import os
 from azure import AzureToken
-from frends import FrendsClient
+from frends import TOPOLOGY_TTL, FrendsClient, FrendsNotFoundError, FrendsTopology
 from vault import VaultKVClient
 
 
-load_dotenv()
+def load_env_file():
+    """Load variables from the nearest .env file, if there is one
+
+    Searches upwards from the directory of this script like find_dotenv does.
+    python-dotenv is only imported when a .env file is actually present,
+    container runs get their configuration from the environment directly.
+    """
+    path = os.path.dirname(os.path.abspath(__file__))
+
+    while True:
+        candidate = os.path.join(path, ".env")
+        if os.path.isfile(candidate):
+            from dotenv import load_dotenv
+
+            load_dotenv(candidate)
+            return
+
+        parent = os.path.dirname(path)
+        if parent == path:
+            return
+
+        path = parent
+
+
+load_env_file()
 
 
 class Sync:
     """Container class for the sync process"""
 
     frends_url: str
+    frends_topology_cache: str = None
+    frends_topology_ttl: int = TOPOLOGY_TTL
     vault_address: str
     vault_token: str
 
@@ -65,6 +87,15 @@ class Sync:
         self.vault_store = self.env_var("VAULT_STORE", True)
 
         self.frends_url = self.env_var("FRENDS_API_URL", True)
+        self.frends_topology_cache = self.env_var("FRENDS_TOPOLOGY_CACHE", False)
+        ttl = self.env_var("FRENDS_TOPOLOGY_TTL", False)
+        if ttl:
+            try:
+                self.frends_topology_ttl = int(ttl)
+            except ValueError:
+                raise Exception(
+                    "Invalid integer in environment variable: FRENDS_TOPOLOGY_TTL"
+                )
 
         if isinstance(self.env_var("DEBUG_MODE", False), str) and self.env_var(
             "DEBUG_MODE", False
@@ -87,7 +118,13 @@ class Sync:
             self.vault_address, self.vault_token, self.vault_store
         )
 
-        self.frends_client = FrendsClient(self.frends_url, self.azure_token)
+        self.frends_client = FrendsClient(
+            self.frends_url,
+            self.azure_token,
+            FrendsTopology.from_cache(
+                self.frends_topology_cache, self.frends_topology_ttl
+            ),
+        )
 
     def flatten_tree(self, namespaced: dict):
         """Flatten the hierarchical Vault KV store to a flat dictionary
@@ -139,42 +176,48 @@ class Sync:
             vault (dict): The formatted values from Hashicorp Vault
         """
         for toplevel, items in vault.items():
-            frends = self.frends_client.get_env(toplevel)
-
-            if frends is None:
-                envid = self.frends_client.create_env_group(toplevel)
             try:
-                self.frends_client.set_env_description(
-                    getattr(frends, "id", None) or envid,
-                    "Automatically synced from Vault",
-                )
-            except Exception:
-                pass
-
-            for key, value in items.items():
-                # Check if there are multiple fields in the json or just one
-                fields = json.loads(value)
-                if len(fields) == 1 and isinstance(fields, dict):
-                    value = fields[list(fields.keys())[0]]
-
-                var_type = "Secret"
-
-                if self.debug_mode is True:
-                    print("\033[31m!!!! WARNING: Debug mode is enabled !!!!")
-                    print("All secrets WILL BE TRANSFERRED IN CLEAR TEXT FORM")
-                    print(
-                        "After disabling debug mode, all secrets need to be deleted and re-synced\033[0m"
-                    )
-
-                    var_type = "String"
-
-                self.frends_client.insert_update_env(
-                    parent=getattr(frends, "id", None) or envid,
-                    name=key,
-                    content=value,
-                    var_type=var_type,
+                self.update_group(toplevel, items)
+            except FrendsNotFoundError:
+                # The cached topology is out of date, rediscover and try once more
+                self.frends_client.topology.invalidate()
+                self.update_group(toplevel, items)
+
+    def update_group(self, toplevel: str, items: dict):
+        """Update the environment variables of a single group in Frends
+
+        Args:
+            toplevel (str): The name of the group
+            items (dict): The formatted values for the group
+        """
+        envid = self.frends_client.get_group_id(
+            toplevel, "Automatically synced from Vault"
+        )
+
+        for key, value in items.items():
+            # Check if there are multiple fields in the json or just one
+            fields = json.loads(value)
+            if len(fields) == 1 and isinstance(fields, dict):
+                value = fields[list(fields.keys())[0]]
+
+            var_type = "Secret"
+
+            if self.debug_mode is True:
+                print("\033[31m!!!! WARNING: Debug mode is enabled !!!!")
+                print("All secrets WILL BE TRANSFERRED IN CLEAR TEXT FORM")
+                print(
+                    "After disabling debug mode, all secrets need to be deleted and re-synced\033[0m"
                 )
 
+                var_type = "String"
+
+            self.frends_client.insert_update_env(
+                parent=envid,
+                name=key,
+                content=value,
+                var_type=var_type,
+            )
+
 
 if __name__ == "__main__":
     sync = Sync()
@@ -1,4 +1,4 @@
-import hvac, re, os
+import re, os
 
 
 def fmt_str(string: str):
@@ -21,6 +21,8 @@ class VaultKVClient:
     """Client for accessing Hashicorp Vault"""
 
     def __init__(self, vault_url: str, vault_token: str, mountpoint: str):
+        import hvac
+
         self.client = hvac.Client(verify=False)
         self.client.url = vault_url
         self.client.token = vault_token
@@ -30,17 +32,21 @@ class VaultKVClient:
 
     def list_secrets(self, path: str = ""):
         """List all secrets in a given path"""
+        from hvac.exceptions import InvalidPath
+
         try:
             secretlist = self.client.secrets.kv.v2.list_secrets(
                 mount_point=self.mountpoint, path=path
             )
-        except hvac.exceptions.InvalidPath:
+        except InvalidPath:
             secretlist = {}
 
         return secretlist.get("data", {}).get("keys", [])
 
     def list_secrets_recursive(self, path: str = ""):
         """Recursively list all secrets in a given path"""
+        from hvac.exceptions import InvalidPath
+
         secret_tree = self.list_secrets(path)
         out = {}
         if len(secret_tree) > 0:
@@ -50,7 +56,7 @@ class VaultKVClient:
         else:
             try:
                 return self.read_secret(path)
-            except hvac.exceptions.InvalidPath:
+            except InvalidPath:
                 newpath = "/".join(newpath.split("/")[0:-1])
                 return self.read_secret(newpath)
         return out